@@ -1,13 +1,49 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from api.persistence.db import aquecer_pool, engine
 from api.routers.carteira_router import router as carteiras_router
+from api.services.carteira_service import NaoEncontrado
+from api.services.coinbase_service import CoinbaseService
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    resultados = await asyncio.gather(
+        aquecer_pool(),
+        CoinbaseService.aquecer(),
+        return_exceptions=True,
+    )
+    for etapa, resultado in zip(("pool do banco", "cotação Coinbase"), resultados):
+        if isinstance(resultado, Exception):
+            logger.warning(f"Falha no aquecimento ({etapa}): {resultado}")
+    yield
+    await CoinbaseService.fechar()
+    await engine.dispose()
+
+async def _nao_encontrado(request: Request, exc: NaoEncontrado) -> JSONResponse:
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+async def _requisicao_invalida(request: Request, exc: ValueError) -> JSONResponse:
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+async def _erro_interno(request: Request, exc: RuntimeError) -> JSONResponse:
+    return JSONResponse(status_code=500, content={"detail": str(exc)})
 
 def create_app() -> FastAPI:
     app = FastAPI(
         title="Carteira Digital API",
         version="1.0.1",
         description="API educacional de carteira digital com SQL puro e FastAPI.",
+        lifespan=lifespan,
     )
 
+    app.add_exception_handler(NaoEncontrado, _nao_encontrado)
+    app.add_exception_handler(ValueError, _requisicao_invalida)
+    app.add_exception_handler(RuntimeError, _erro_interno)
     app.include_router(carteiras_router)
 
     return app
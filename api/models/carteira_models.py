@@ -1,7 +1,14 @@
-from typing import Literal, List
+from typing import Annotated, Literal, List
 from datetime import datetime
 from decimal import Decimal
-from pydantic import BaseModel, Field, field_serializer
+from pydantic import BaseModel, Field, PlainSerializer
+
+_ZERO_8 = "0.00000000"
+
+def _formatar_decimal(value: Decimal) -> str:
+    return _ZERO_8 if not value else f"{value:.8f}"
+
+Decimal8 = Annotated[Decimal, PlainSerializer(_formatar_decimal, return_type=str)]
 
 class Carteira(BaseModel):
     endereco_carteira: str
@@ -20,11 +27,7 @@ class SaldoMoeda(BaseModel):
     codigo_moeda: str
     nome_moeda: str
     tipo_moeda: Literal["CRYPTO", "FIAT"]
-    saldo: Decimal = Field(default=Decimal("0.00000000"))
-
-    @field_serializer('saldo')
-    def serialize_saldo(self, value: Decimal) -> str:
-        return f"{value:.8f}"
+    saldo: Decimal8 = Field(default=Decimal("0.00000000"))
 
 class SaldosCarteira(BaseModel):
     endereco_carteira: str
@@ -44,17 +47,13 @@ class OperacaoResponse(BaseModel):
     endereco_carteira: str
     codigo_moeda: str
     tipo_operacao: Literal["DEPOSITO", "SAQUE"]
-    valor: Decimal
-    taxa: Decimal
-    valor_liquido: Decimal
-    saldo_anterior: Decimal
-    saldo_atual: Decimal
+    valor: Decimal8
+    taxa: Decimal8
+    valor_liquido: Decimal8
+    saldo_anterior: Decimal8
+    saldo_atual: Decimal8
     data_operacao: datetime
 
-    @field_serializer('valor', 'taxa', 'valor_liquido', 'saldo_anterior', 'saldo_atual')
-    def serialize_decimal(self, value: Decimal) -> str:
-        return f"{value:.8f}"
-
 class ConversaoRequest(BaseModel):
     moeda_origem: str = Field(..., description="Código da moeda de origem (BTC, ETH, SOL, USD, BRL)")
     moeda_destino: str = Field(..., description="Código da moeda de destino (BTC, ETH, SOL, USD, BRL)")
@@ -66,22 +65,16 @@ class ConversaoResponse(BaseModel):
     endereco_carteira: str
     moeda_origem: str
     moeda_destino: str
-    valor_origem: Decimal
-    cotacao: Decimal
-    taxa_conversao: Decimal
-    valor_destino: Decimal
-    saldo_origem_anterior: Decimal
-    saldo_origem_atual: Decimal
-    saldo_destino_anterior: Decimal
-    saldo_destino_atual: Decimal
+    valor_origem: Decimal8
+    cotacao: Decimal8
+    taxa_conversao: Decimal8
+    valor_destino: Decimal8
+    saldo_origem_anterior: Decimal8
+    saldo_origem_atual: Decimal8
+    saldo_destino_anterior: Decimal8
+    saldo_destino_atual: Decimal8
     data_conversao: datetime
 
-    @field_serializer('valor_origem', 'cotacao', 'taxa_conversao', 'valor_destino',
-                    'saldo_origem_anterior', 'saldo_origem_atual',
-                    'saldo_destino_anterior', 'saldo_destino_atual')
-    def serialize_decimal(self, value: Decimal) -> str:
-        return f"{value:.8f}"
-
 class TransferenciaRequest(BaseModel):
     endereco_destino: str = Field(..., description="Endereço da carteira de destino")
     codigo_moeda: str = Field(..., description="Código da moeda (BTC, ETH, SOL, USD, BRL)")
@@ -93,17 +86,11 @@ class TransferenciaResponse(BaseModel):
     endereco_origem: str
     endereco_destino: str
     codigo_moeda: str
-    valor: Decimal
-    taxa: Decimal
-    valor_liquido: Decimal
-    saldo_origem_anterior: Decimal
-    saldo_origem_atual: Decimal
-    saldo_destino_anterior: Decimal
-    saldo_destino_atual: Decimal
-    data_transferencia: datetime
-
-    @field_serializer('valor', 'taxa', 'valor_liquido',
-                    'saldo_origem_anterior', 'saldo_origem_atual',
-                    'saldo_destino_anterior', 'saldo_destino_atual')
-    def serialize_decimal(self, value: Decimal) -> str:
-        return f"{value:.8f}"
\ No newline at end of file
+    valor: Decimal8
+    taxa: Decimal8
+    valor_liquido: Decimal8
+    saldo_origem_anterior: Decimal8
+    saldo_origem_atual: Decimal8
+    saldo_destino_anterior: Decimal8
+    saldo_destino_atual: Decimal8
+    data_transferencia: datetime
\ No newline at end of file
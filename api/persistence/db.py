@@ -1,10 +1,11 @@
+import asyncio
 import os
 from pathlib import Path
-from contextlib import contextmanager
+from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.engine import Engine, Connection
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncConnection
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 ENV_PATH = BASE_DIR / ".env"
@@ -20,25 +21,46 @@ def get_database_url() -> str:
     if not all([user, password, db]):
         raise RuntimeError("Variáveis de ambiente do banco não configuradas corretamente.")
 
-    return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db}"
+    return f"postgresql+asyncpg://{user}:{password}@{host}:{port}/{db}"
 
 DATABASE_URL = get_database_url()
 
-engine: Engine = create_engine(
+engine: AsyncEngine = create_async_engine(
     DATABASE_URL,
-    future=True,
-    pool_pre_ping=True,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
+    pool_timeout=5,
+    pool_recycle=1800,
+    pool_pre_ping=False,
 )
 
-@contextmanager
-def get_connection() -> Connection:
-    conn: Connection = engine.connect()
-    trans = conn.begin()
+@asynccontextmanager
+async def get_connection() -> AsyncConnection:
+    conn: AsyncConnection = await engine.connect()
+    trans = await conn.begin()
     try:
         yield conn
-        trans.commit()
+        await trans.commit()
     except Exception:
-        trans.rollback()
+        await trans.rollback()
         raise
     finally:
-        conn.close()
\ No newline at end of file
+        await conn.close()
+
+@asynccontextmanager
+async def get_readonly_connection() -> AsyncConnection:
+    conn: AsyncConnection = await engine.connect()
+    await conn.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+async def aquecer_pool() -> None:
+    # Abre pool_size conexões ao mesmo tempo para que as primeiras
+    # requisições não paguem o handshake com o banco.
+    async def _abrir() -> None:
+        async with get_readonly_connection() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(_abrir() for _ in range(engine.pool.size())))
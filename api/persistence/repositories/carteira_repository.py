@@ -1,266 +1,430 @@
 import os
 import secrets
 import hashlib
+import hmac
 from typing import Dict, Any, Optional, List
 from decimal import Decimal
-from sqlalchemy import text
-from api.persistence.db import get_connection
+from sqlalchemy import Row, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from api.persistence.db import get_connection, get_readonly_connection
+
+_PRIVATE_KEY_SIZE: int = int(os.getenv("PRIVATE_KEY_SIZE", "32"))
+_PUBLIC_KEY_SIZE: int = int(os.getenv("PUBLIC_KEY_SIZE", "16"))
+
+_SQL_LISTAR_MOEDAS = text("SELECT id_moeda, codigo FROM moeda")
+
+_SQL_INSERIR_CARTEIRA = text("""
+    INSERT INTO carteira (endereco_carteira, hash_chave_privada)
+    VALUES (:endereco, :hash_privada)
+    RETURNING endereco_carteira, data_criacao, status, hash_chave_privada
+""")
+
+_SQL_INSERIR_SALDO_INICIAL = text("""
+    INSERT INTO saldo_carteira (endereco_carteira, id_moeda, saldo)
+    VALUES (:endereco, :id_moeda, 0.00000000)
+""")
+
+_SQL_BUSCAR_CARTEIRA = text("""
+    SELECT endereco_carteira,
+        data_criacao,
+        status,
+        hash_chave_privada
+    FROM carteira
+    WHERE endereco_carteira = :endereco
+""")
+
+_SQL_LISTAR_CARTEIRAS = text("""
+    SELECT endereco_carteira,
+        data_criacao,
+        status
+    FROM carteira
+    ORDER BY data_criacao DESC, endereco_carteira DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+_SQL_ATUALIZAR_STATUS = text("""
+    UPDATE carteira
+        SET status = :status
+    WHERE endereco_carteira = :endereco
+    RETURNING endereco_carteira, data_criacao, status, hash_chave_privada
+""")
+
+_SQL_BUSCAR_SALDOS = text("""
+    SELECT
+        m.codigo as codigo_moeda,
+        m.nome as nome_moeda,
+        m.tipo as tipo_moeda,
+        s.saldo
+    FROM saldo_carteira s
+    INNER JOIN moeda m ON s.id_moeda = m.id_moeda
+    WHERE s.endereco_carteira = :endereco
+    ORDER BY m.tipo, m.codigo
+""")
+
+_SQL_BUSCAR_HASH_CHAVE = text("""
+    SELECT hash_chave_privada
+    FROM carteira
+    WHERE endereco_carteira = :endereco
+""")
+
+_SQL_BUSCAR_CONTEXTO_TRANSFERENCIA = text("""
+    SELECT endereco_carteira,
+        status,
+        hash_chave_privada
+    FROM carteira
+    WHERE endereco_carteira IN (:endereco_origem, :endereco_destino)
+""")
+
+_SQL_BUSCAR_SALDO_MOEDA = text("""
+    SELECT saldo
+    FROM saldo_carteira
+    WHERE endereco_carteira = :endereco AND id_moeda = :id_moeda
+""")
+
+_SQL_DEPOSITAR = text("""
+    WITH valores AS (
+        SELECT CAST(:valor AS NUMERIC(18, 8)) AS valor
+    ),
+    credito AS (
+        UPDATE saldo_carteira
+        SET saldo = saldo + v.valor
+        FROM valores v
+        WHERE endereco_carteira = :endereco
+        AND id_moeda = :id_moeda
+        RETURNING saldo - v.valor AS saldo_anterior, saldo AS saldo_atual, v.valor
+    ),
+    registro AS (
+        INSERT INTO deposito_saque
+        (endereco_carteira, id_moeda, tipo, valor, taxa_valor)
+        SELECT :endereco, :id_moeda, 'DEPOSITO', valor, 0.00000000
+        FROM credito
+        RETURNING id_movimento, endereco_carteira, tipo,
+            valor, taxa_valor, data_hora
+    )
+    SELECT r.*, c.saldo_anterior, c.saldo_atual
+    FROM registro r, credito c
+""")
+
+_SQL_SACAR = text("""
+    WITH valores AS (
+        SELECT CAST(:valor AS NUMERIC(18, 8)) AS valor,
+            CAST(CAST(:valor AS NUMERIC) * CAST(:taxa_percentual AS NUMERIC) AS NUMERIC(18, 8)) AS taxa
+    ),
+    debito AS (
+        UPDATE saldo_carteira
+        SET saldo = saldo - (v.valor + v.taxa)
+        FROM valores v
+        WHERE endereco_carteira = :endereco
+        AND id_moeda = :id_moeda
+        AND saldo >= v.valor + v.taxa
+        RETURNING saldo + v.valor + v.taxa AS saldo_anterior, saldo AS saldo_atual, v.taxa
+    ),
+    registro AS (
+        INSERT INTO deposito_saque
+        (endereco_carteira, id_moeda, tipo, valor, taxa_valor)
+        SELECT :endereco, :id_moeda, 'SAQUE', :valor, taxa
+        FROM debito
+        RETURNING id_movimento, endereco_carteira, tipo,
+            valor, taxa_valor, data_hora
+    )
+    SELECT r.*, d.saldo_anterior, d.saldo_atual
+    FROM registro r, debito d
+""")
+
+_SQL_CONVERTER = text("""
+    WITH bloqueio AS (
+        SELECT id_moeda
+        FROM saldo_carteira
+        WHERE endereco_carteira = :endereco
+        AND id_moeda IN (:id_moeda_origem, :id_moeda_destino)
+        ORDER BY id_moeda
+        FOR UPDATE
+    ),
+    valores AS (
+        SELECT CAST(:valor_origem AS NUMERIC(18, 8)) AS valor_origem,
+            CAST(:valor_destino AS NUMERIC(18, 8)) AS valor_destino
+    ),
+    origem AS (
+        UPDATE saldo_carteira
+        SET saldo = saldo - v.valor_origem
+        FROM valores v
+        WHERE endereco_carteira = :endereco
+        AND id_moeda = :id_moeda_origem
+        AND saldo >= v.valor_origem
+        AND (SELECT count(*) FROM bloqueio) = 2
+        RETURNING saldo + v.valor_origem AS saldo_anterior, saldo AS saldo_atual
+    ),
+    destino AS (
+        UPDATE saldo_carteira
+        SET saldo = saldo + v.valor_destino
+        FROM valores v
+        WHERE endereco_carteira = :endereco
+        AND id_moeda = :id_moeda_destino
+        AND EXISTS (SELECT 1 FROM origem)
+        RETURNING saldo - v.valor_destino AS saldo_anterior, saldo AS saldo_atual
+    ),
+    registro AS (
+        INSERT INTO conversao
+        (endereco_carteira, id_moeda_origem, id_moeda_destino, valor_origem, valor_destino,
+            taxa_percentual, taxa_valor, cotacao_utilizada)
+        SELECT :endereco,
+            :id_moeda_origem, :id_moeda_destino,
+            v.valor_origem, v.valor_destino,
+            :taxa_valor / NULLIF(v.valor_origem, 0), :taxa_valor, :cotacao
+        FROM destino, valores v
+        RETURNING id_conversao, endereco_carteira, valor_origem, valor_destino,
+            taxa_valor, cotacao_utilizada, data_hora
+    )
+    SELECT r.*,
+        o.saldo_anterior AS saldo_origem_anterior, o.saldo_atual AS saldo_origem_atual,
+        d.saldo_anterior AS saldo_destino_anterior, d.saldo_atual AS saldo_destino_atual
+    FROM registro r, origem o, destino d
+""")
+
+_SQL_TRANSFERIR = text("""
+    WITH bloqueio AS (
+        SELECT endereco_carteira
+        FROM saldo_carteira
+        WHERE endereco_carteira IN (:endereco_origem, :endereco_destino)
+        AND id_moeda = :id_moeda
+        ORDER BY endereco_carteira
+        FOR UPDATE
+    ),
+    valores AS (
+        SELECT CAST(:valor AS NUMERIC(18, 8)) AS valor,
+            CAST(CAST(:valor AS NUMERIC) * CAST(:taxa_percentual AS NUMERIC) AS NUMERIC(18, 8)) AS taxa
+    ),
+    origem AS (
+        UPDATE saldo_carteira
+        SET saldo = saldo - (v.valor + v.taxa)
+        FROM valores v
+        WHERE endereco_carteira = :endereco_origem
+        AND id_moeda = :id_moeda
+        AND saldo >= v.valor + v.taxa
+        AND (SELECT count(*) FROM bloqueio) = 2
+        RETURNING saldo + v.valor + v.taxa AS saldo_anterior, saldo AS saldo_atual, v.taxa
+    ),
+    destino AS (
+        UPDATE saldo_carteira
+        SET saldo = saldo + v.valor
+        FROM valores v
+        WHERE endereco_carteira = :endereco_destino
+        AND id_moeda = :id_moeda
+        AND EXISTS (SELECT 1 FROM origem)
+        RETURNING saldo - v.valor AS saldo_anterior, saldo AS saldo_atual
+    ),
+    registro AS (
+        INSERT INTO transferencia
+        (endereco_origem, endereco_destino, id_moeda, valor, taxa_valor)
+        SELECT :endereco_origem, :endereco_destino,
+            :id_moeda, v.valor, o.taxa
+        FROM destino, origem o, valores v
+        RETURNING id_transferencia, endereco_origem, endereco_destino,
+            valor, taxa_valor, data_hora
+    )
+    SELECT r.*,
+        o.saldo_anterior AS saldo_origem_anterior, o.saldo_atual AS saldo_origem_atual,
+        d.saldo_anterior AS saldo_destino_anterior, d.saldo_atual AS saldo_destino_atual
+    FROM registro r, origem o, destino d
+""")
+
+# A tabela moeda é pequena e praticamente estática: o mapa codigo -> id_moeda
+# é carregado uma vez e reutilizado, evitando subconsultas em cada escrita.
+_MOEDA_ID_CACHE: Dict[str, int] = {}
+
+async def _carregar_moedas(conn: AsyncConnection) -> Dict[str, int]:
+    rows = (await conn.execute(_SQL_LISTAR_MOEDAS)).mappings().all()
+    _MOEDA_ID_CACHE.update({r["codigo"]: r["id_moeda"] for r in rows})
+    return _MOEDA_ID_CACHE
+
+async def _get_id_moeda(conn: AsyncConnection, codigo: str) -> Optional[int]:
+    if codigo not in _MOEDA_ID_CACHE:
+        await _carregar_moedas(conn)
+    return _MOEDA_ID_CACHE.get(codigo)
+
+async def _listar_ids_moeda(conn: AsyncConnection) -> List[int]:
+    moedas = _MOEDA_ID_CACHE or await _carregar_moedas(conn)
+    return list(moedas.values())
+
+def _chave_confere(hash_armazenado: str, chave_privada: str) -> bool:
+    hash_fornecido = hashlib.sha256(chave_privada.encode()).hexdigest()
+    return hmac.compare_digest(hash_armazenado, hash_fornecido)
 
 class CarteiraRepository:
 
-    def criar(self) -> Dict[str, Any]:
-        private_key_size:int = int(os.getenv("PRIVATE_KEY_SIZE"))
-        public_key_size:int = int(os.getenv("PUBLIC_KEY_SIZE"))
-        chave_privada = secrets.token_hex(private_key_size)
-        endereco = secrets.token_hex(public_key_size)
+    async def criar(self) -> Dict[str, Any]:
+        chave_privada = secrets.token_hex(_PRIVATE_KEY_SIZE)
+        endereco = secrets.token_hex(_PUBLIC_KEY_SIZE)
         hash_privada = hashlib.sha256(chave_privada.encode()).hexdigest()
 
-        with get_connection() as conn:
-            conn.execute(
-                text("""
-                    INSERT INTO carteira (endereco_carteira, hash_chave_privada)
-                    VALUES (:endereco, :hash_privada)
-                """),
+        async with get_connection() as conn:
+            row = (await conn.execute(
+                _SQL_INSERIR_CARTEIRA,
                 {"endereco": endereco, "hash_privada": hash_privada},
-            )
-
-            conn.execute(
-                text("""
-                    INSERT INTO saldo_carteira (endereco_carteira, id_moeda, saldo)
-                    SELECT :endereco, id_moeda, 0.00000000
-                    FROM moeda
-                """),
-                {"endereco": endereco},
-            )
-
-            row = conn.execute(
-                text("""
-                    SELECT endereco_carteira,
-                            data_criacao,
-                            status,
-                            hash_chave_privada
-                        FROM carteira
-                    WHERE endereco_carteira = :endereco
-                """),
-                {"endereco": endereco},
-            ).mappings().first()
+            )).mappings().first()
+
+            saldos_iniciais = [
+                {"endereco": endereco, "id_moeda": id_moeda}
+                for id_moeda in await _listar_ids_moeda(conn)
+            ]
+            if saldos_iniciais:
+                await conn.execute(_SQL_INSERIR_SALDO_INICIAL, saldos_iniciais)
 
         carteira = dict(row)
         carteira["chave_privada"] = chave_privada
         return carteira
 
-    def buscar_por_endereco(self, endereco_carteira: str) -> Optional[Dict[str, Any]]:
-        with get_connection() as conn:
-            row = conn.execute(
-                text("""
-                    SELECT endereco_carteira,
-                            data_criacao,
-                            status,
-                            hash_chave_privada
-                        FROM carteira
-                    WHERE endereco_carteira = :endereco
-                """),
+    async def buscar_por_endereco(self, endereco_carteira: str) -> Optional[Dict[str, Any]]:
+        async with get_readonly_connection() as conn:
+            row = (await conn.execute(
+                _SQL_BUSCAR_CARTEIRA,
                 {"endereco": endereco_carteira},
-            ).mappings().first()
+            )).mappings().first()
 
         return dict(row) if row else None
 
-    def listar(self) -> List[Dict[str, Any]]:
-        with get_connection() as conn:
-            rows = conn.execute(
-                text("""
-                    SELECT endereco_carteira,
-                        data_criacao,
-                        status,
-                        hash_chave_privada
-                    FROM carteira
-                """)
-            ).mappings().all()
+    async def listar(self, limit: int, offset: int) -> List[Row]:
+        async with get_readonly_connection() as conn:
+            rows = (await conn.execute(
+                _SQL_LISTAR_CARTEIRAS,
+                {"limit": limit, "offset": offset},
+            )).all()
 
-        return [dict(r) for r in rows]
+        return rows
 
-    def atualizar_status(self, endereco_carteira: str, status: str) -> Optional[Dict[str, Any]]:
-        with get_connection() as conn:
-            conn.execute(
-                text("""
-                    UPDATE carteira
-                        SET status = :status
-                    WHERE endereco_carteira = :endereco
-                """),
+    async def atualizar_status(self, endereco_carteira: str, status: str) -> Optional[Dict[str, Any]]:
+        async with get_connection() as conn:
+            row = (await conn.execute(
+                _SQL_ATUALIZAR_STATUS,
                 {"status": status, "endereco": endereco_carteira},
-            )
-
-            row = conn.execute(
-                text("""
-                    SELECT endereco_carteira,
-                        data_criacao,
-                        status,
-                        hash_chave_privada
-                    FROM carteira
-                    WHERE endereco_carteira = :endereco
-                """),
-                {"endereco": endereco_carteira},
-            ).mappings().first()
+            )).mappings().first()
 
         return dict(row) if row else None
 
-    def buscar_saldos(self, endereco_carteira: str) -> List[Dict[str, Any]]:
-        with get_connection() as conn:
-            rows = conn.execute(
-                text("""
-                    SELECT
-                        m.codigo as codigo_moeda,
-                        m.nome as nome_moeda,
-                        m.tipo as tipo_moeda,
-                        s.saldo
-                    FROM saldo_carteira s
-                    INNER JOIN moeda m ON s.id_moeda = m.id_moeda
-                    WHERE s.endereco_carteira = :endereco
-                    ORDER BY m.tipo, m.codigo
-                """),
+    async def buscar_saldos(self, endereco_carteira: str) -> List[Dict[str, Any]]:
+        async with get_readonly_connection() as conn:
+            rows = (await conn.execute(
+                _SQL_BUSCAR_SALDOS,
                 {"endereco": endereco_carteira},
-            ).mappings().all()
+            )).mappings().all()
 
         return [dict(r) for r in rows]
 
-    def validar_chave_privada(self, endereco_carteira: str, chave_privada: str) -> bool:
-        hash_fornecido = hashlib.sha256(chave_privada.encode()).hexdigest()
-        
-        with get_connection() as conn:
-            row = conn.execute(
-                text("""
-                    SELECT hash_chave_privada
-                    FROM carteira
-                    WHERE endereco_carteira = :endereco
-                """),
+    async def validar_chave_privada(self, endereco_carteira: str, chave_privada: str) -> bool:
+        async with get_readonly_connection() as conn:
+            row = (await conn.execute(
+                _SQL_BUSCAR_HASH_CHAVE,
                 {"endereco": endereco_carteira},
-            ).mappings().first()
+            )).mappings().first()
         
         if not row:
             return False
         
-        return row["hash_chave_privada"] == hash_fornecido
-
-    def buscar_saldo_moeda(self, endereco_carteira: str, codigo_moeda: str) -> Optional[Decimal]:
-        with get_connection() as conn:
-            row = conn.execute(
-                text("""
-                    SELECT s.saldo
-                    FROM saldo_carteira s
-                    INNER JOIN moeda m ON s.id_moeda = m.id_moeda
-                    WHERE s.endereco_carteira = :endereco AND m.codigo = :moeda
-                """),
-                {"endereco": endereco_carteira, "moeda": codigo_moeda},
-            ).mappings().first()
+        return _chave_confere(row["hash_chave_privada"], chave_privada)
+
+    async def carregar_contexto_transferencia(
+        self, endereco_origem: str, endereco_destino: str, chave_privada: str
+    ) -> Dict[str, Any]:
+        async with get_readonly_connection() as conn:
+            rows = (await conn.execute(
+                _SQL_BUSCAR_CONTEXTO_TRANSFERENCIA,
+                {"endereco_origem": endereco_origem, "endereco_destino": endereco_destino},
+            )).mappings().all()
+
+        carteiras = {r["endereco_carteira"]: r for r in rows}
+        origem = carteiras.get(endereco_origem)
+        destino = carteiras.get(endereco_destino)
+
+        return {
+            "origem_status": origem["status"] if origem else None,
+            "destino_status": destino["status"] if destino else None,
+            "chave_valida": bool(origem) and _chave_confere(origem["hash_chave_privada"], chave_privada),
+        }
+
+    async def moeda_existe(self, codigo_moeda: str) -> bool:
+        if codigo_moeda in _MOEDA_ID_CACHE:
+            return True
+        async with get_readonly_connection() as conn:
+            return await _get_id_moeda(conn, codigo_moeda) is not None
+
+    async def buscar_saldo_moeda(self, endereco_carteira: str, codigo_moeda: str) -> Optional[Decimal]:
+        async with get_readonly_connection() as conn:
+            row = (await conn.execute(
+                _SQL_BUSCAR_SALDO_MOEDA,
+                {"endereco": endereco_carteira, "id_moeda": await _get_id_moeda(conn, codigo_moeda)},
+            )).mappings().first()
         
-        return Decimal(str(row["saldo"])) if row else None
-
-    def atualizar_saldo(self, endereco_carteira: str, codigo_moeda: str, novo_saldo: Decimal) -> None:
-        with get_connection() as conn:
-            conn.execute(
-                text("""
-                    UPDATE saldo_carteira
-                    SET saldo = :novo_saldo
-                    WHERE endereco_carteira = :endereco
-                    AND id_moeda = (SELECT id_moeda FROM moeda WHERE codigo = :moeda)
-                """),
-                {"novo_saldo": novo_saldo, "endereco": endereco_carteira, "moeda": codigo_moeda},
-            )
-
-    def registrar_deposito(
+        return row["saldo"] if row else None
+
+    async def registrar_deposito(
         self,
         endereco_carteira: str,
         codigo_moeda: str,
-        valor: Decimal,
-        saldo_anterior: Decimal,
-        saldo_atual: Decimal
-    ) -> Dict[str, Any]:
-        with get_connection() as conn:
-            row = conn.execute(
-                text("""
-                    INSERT INTO deposito_saque
-                    (endereco_carteira, id_moeda, tipo, valor, taxa_valor)
-                    VALUES (:endereco, (SELECT id_moeda FROM moeda WHERE codigo = :moeda), 'DEPOSITO', :valor, 0.00000000)
-                    RETURNING id_movimento, endereco_carteira, id_moeda, tipo,
-                            valor, taxa_valor, data_hora
-                """),
+        valor: Decimal
+    ) -> Optional[Dict[str, Any]]:
+        async with get_connection() as conn:
+            row = (await conn.execute(
+                _SQL_DEPOSITAR,
                 {
                     "endereco": endereco_carteira,
-                    "moeda": codigo_moeda,
+                    "id_moeda": await _get_id_moeda(conn, codigo_moeda),
                     "valor": valor
                 },
-            ).mappings().first()
-            
-            row_dict = dict(row)
-            moeda_row = conn.execute(
-                text("SELECT codigo as codigo_moeda FROM moeda WHERE id_moeda = :id_moeda"),
-                {"id_moeda": row_dict["id_moeda"]}
-            ).mappings().first()
-            
-            resultado = {
-                "id_operacao": row_dict["id_movimento"],
-                "endereco_carteira": row_dict["endereco_carteira"],
-                "codigo_moeda": moeda_row["codigo_moeda"],
-                "tipo_operacao": row_dict["tipo"],
-                "valor": row_dict["valor"],
-                "taxa": row_dict["taxa_valor"],
-                "valor_liquido": row_dict["valor"],
-                "saldo_anterior": saldo_anterior,
-                "saldo_atual": saldo_atual,
-                "data_operacao": row_dict["data_hora"]
-            }
-        
-        return resultado
+            )).mappings().first()
 
-    def registrar_saque(
+        if not row:
+            return None
+
+        return {
+            "id_operacao": row["id_movimento"],
+            "endereco_carteira": row["endereco_carteira"],
+            "codigo_moeda": codigo_moeda,
+            "tipo_operacao": row["tipo"],
+            "valor": row["valor"],
+            "taxa": row["taxa_valor"],
+            "valor_liquido": row["valor"],
+            "saldo_anterior": row["saldo_anterior"],
+            "saldo_atual": row["saldo_atual"],
+            "data_operacao": row["data_hora"]
+        }
+
+    async def registrar_saque(
         self,
         endereco_carteira: str,
         codigo_moeda: str,
         valor: Decimal,
-        taxa: Decimal,
-        valor_liquido: Decimal,
-        saldo_anterior: Decimal,
-        saldo_atual: Decimal
-    ) -> Dict[str, Any]:
-        with get_connection() as conn:
-            row = conn.execute(
-                text("""
-                    INSERT INTO deposito_saque
-                    (endereco_carteira, id_moeda, tipo, valor, taxa_valor)
-                    VALUES (:endereco, (SELECT id_moeda FROM moeda WHERE codigo = :moeda), 'SAQUE', :valor, :taxa)
-                    RETURNING id_movimento, endereco_carteira, id_moeda, tipo,
-                            valor, taxa_valor, data_hora
-                """),
+        taxa_percentual: Decimal,
+        valor_liquido: Decimal
+    ) -> Optional[Dict[str, Any]]:
+        # A taxa é calculada no próprio UPDATE e devolvida pelo registro.
+        async with get_connection() as conn:
+            row = (await conn.execute(
+                _SQL_SACAR,
                 {
                     "endereco": endereco_carteira,
-                    "moeda": codigo_moeda,
+                    "id_moeda": await _get_id_moeda(conn, codigo_moeda),
                     "valor": valor,
-                    "taxa": taxa
+                    "taxa_percentual": taxa_percentual
                 },
-            ).mappings().first()
-            
-            row_dict = dict(row)
-            moeda_row = conn.execute(
-                text("SELECT codigo as codigo_moeda FROM moeda WHERE id_moeda = :id_moeda"),
-                {"id_moeda": row_dict["id_moeda"]}
-            ).mappings().first()
-            
-            resultado = {
-                "id_operacao": row_dict["id_movimento"],
-                "endereco_carteira": row_dict["endereco_carteira"],
-                "codigo_moeda": moeda_row["codigo_moeda"],
-                "tipo_operacao": row_dict["tipo"],
-                "valor": row_dict["valor"],
-                "taxa": row_dict["taxa_valor"],
-                "valor_liquido": valor_liquido,
-                "saldo_anterior": saldo_anterior,
-                "saldo_atual": saldo_atual,
-                "data_operacao": row_dict["data_hora"]
-            }
-        
-        return resultado
+            )).mappings().first()
+
+        if not row:
+            return None
+
+        return {
+            "id_operacao": row["id_movimento"],
+            "endereco_carteira": row["endereco_carteira"],
+            "codigo_moeda": codigo_moeda,
+            "tipo_operacao": row["tipo"],
+            "valor": row["valor"],
+            "taxa": row["taxa_valor"],
+            "valor_liquido": valor_liquido,
+            "saldo_anterior": row["saldo_anterior"],
+            "saldo_atual": row["saldo_atual"],
+            "data_operacao": row["data_hora"]
+        }
 
-    def registrar_conversao(
+    async def registrar_conversao(
         self,
         endereco_carteira: str,
         moeda_origem: str,
@@ -268,120 +432,80 @@ class CarteiraRepository:
         valor_origem: Decimal,
         cotacao: Decimal,
         taxa_conversao: Decimal,
-        valor_destino: Decimal,
-        saldo_origem_anterior: Decimal,
-        saldo_origem_atual: Decimal,
-        saldo_destino_anterior: Decimal,
-        saldo_destino_atual: Decimal
-    ) -> Dict[str, Any]:
-        taxa_percentual = taxa_conversao / valor_origem if valor_origem > 0 else Decimal("0")
-        
-        with get_connection() as conn:
-            row = conn.execute(
-                text("""
-                    INSERT INTO conversao
-                    (endereco_carteira, id_moeda_origem, id_moeda_destino, valor_origem, valor_destino,
-                        taxa_percentual, taxa_valor, cotacao_utilizada)
-                    VALUES (:endereco,
-                            (SELECT id_moeda FROM moeda WHERE codigo = :moeda_origem),
-                            (SELECT id_moeda FROM moeda WHERE codigo = :moeda_destino),
-                            :valor_origem, :valor_destino,
-                            :taxa_percentual, :taxa_valor, :cotacao)
-                    RETURNING id_conversao, endereco_carteira, id_moeda_origem, id_moeda_destino,
-                            valor_origem, valor_destino, taxa_percentual, taxa_valor,
-                            cotacao_utilizada, data_hora
-                """),
+        valor_destino: Decimal
+    ) -> Optional[Dict[str, Any]]:
+        # Débito, crédito e registro vão em um único comando. As duas linhas de
+        # saldo são travadas antes, sempre na mesma ordem, para que conversões
+        # em sentidos opostos não entrem em deadlock; o débito só acontece se
+        # houver saldo e se a moeda de destino existir na carteira.
+        async with get_connection() as conn:
+            row = (await conn.execute(
+                _SQL_CONVERTER,
                 {
                     "endereco": endereco_carteira,
-                    "moeda_origem": moeda_origem,
-                    "moeda_destino": moeda_destino,
+                    "id_moeda_origem": await _get_id_moeda(conn, moeda_origem),
+                    "id_moeda_destino": await _get_id_moeda(conn, moeda_destino),
                     "valor_origem": valor_origem,
                     "valor_destino": valor_destino,
-                    "taxa_percentual": taxa_percentual,
                     "taxa_valor": taxa_conversao,
                     "cotacao": cotacao
                 },
-            ).mappings().first()
-            
-            row_dict = dict(row)
-            moeda_origem_row = conn.execute(
-                text("SELECT codigo FROM moeda WHERE id_moeda = :id_moeda"),
-                {"id_moeda": row_dict["id_moeda_origem"]}
-            ).mappings().first()
-            moeda_destino_row = conn.execute(
-                text("SELECT codigo FROM moeda WHERE id_moeda = :id_moeda"),
-                {"id_moeda": row_dict["id_moeda_destino"]}
-            ).mappings().first()
-            
-            resultado = {
-                "id_conversao": row_dict["id_conversao"],
-                "endereco_carteira": row_dict["endereco_carteira"],
-                "moeda_origem": moeda_origem_row["codigo"],
-                "moeda_destino": moeda_destino_row["codigo"],
-                "valor_origem": row_dict["valor_origem"],
-                "cotacao": row_dict["cotacao_utilizada"],
-                "taxa_conversao": row_dict["taxa_valor"],
-                "valor_destino": row_dict["valor_destino"],
-                "saldo_origem_anterior": saldo_origem_anterior,
-                "saldo_origem_atual": saldo_origem_atual,
-                "saldo_destino_anterior": saldo_destino_anterior,
-                "saldo_destino_atual": saldo_destino_atual,
-                "data_conversao": row_dict["data_hora"]
-            }
-        
-        return resultado
+            )).mappings().first()
+
+        if not row:
+            return None
 
-    def registrar_transferencia(
+        return {
+            "id_conversao": row["id_conversao"],
+            "endereco_carteira": row["endereco_carteira"],
+            "moeda_origem": moeda_origem,
+            "moeda_destino": moeda_destino,
+            "valor_origem": row["valor_origem"],
+            "cotacao": row["cotacao_utilizada"],
+            "taxa_conversao": row["taxa_valor"],
+            "valor_destino": row["valor_destino"],
+            "saldo_origem_anterior": row["saldo_origem_anterior"],
+            "saldo_origem_atual": row["saldo_origem_atual"],
+            "saldo_destino_anterior": row["saldo_destino_anterior"],
+            "saldo_destino_atual": row["saldo_destino_atual"],
+            "data_conversao": row["data_hora"]
+        }
+
+    async def registrar_transferencia(
         self,
         endereco_origem: str,
         endereco_destino: str,
         codigo_moeda: str,
         valor: Decimal,
-        taxa: Decimal,
-        valor_liquido: Decimal,
-        saldo_origem_anterior: Decimal,
-        saldo_origem_atual: Decimal,
-        saldo_destino_anterior: Decimal,
-        saldo_destino_atual: Decimal
-    ) -> Dict[str, Any]:
-        with get_connection() as conn:
-            row = conn.execute(
-                text("""
-                    INSERT INTO transferencia
-                    (endereco_origem, endereco_destino, id_moeda, valor, taxa_valor)
-                    VALUES (:endereco_origem, :endereco_destino,
-                            (SELECT id_moeda FROM moeda WHERE codigo = :codigo_moeda),
-                            :valor, :taxa)
-                    RETURNING id_transferencia, endereco_origem, endereco_destino, id_moeda,
-                            valor, taxa_valor, data_hora
-                """),
+        taxa_percentual: Decimal,
+        valor_liquido: Decimal
+    ) -> Optional[Dict[str, Any]]:
+        async with get_connection() as conn:
+            row = (await conn.execute(
+                _SQL_TRANSFERIR,
                 {
                     "endereco_origem": endereco_origem,
                     "endereco_destino": endereco_destino,
-                    "codigo_moeda": codigo_moeda,
+                    "id_moeda": await _get_id_moeda(conn, codigo_moeda),
                     "valor": valor,
-                    "taxa": taxa
+                    "taxa_percentual": taxa_percentual
                 },
-            ).mappings().first()
-            row_dict = dict(row)
-            moeda_row = conn.execute(
-                text("SELECT codigo as codigo_moeda FROM moeda WHERE id_moeda = :id_moeda"),
-                {"id_moeda": row_dict["id_moeda"]}
-            ).mappings().first()
-            
-            resultado = {
-                "id_transferencia": row_dict["id_transferencia"],
-                "endereco_origem": row_dict["endereco_origem"],
-                "endereco_destino": row_dict["endereco_destino"],
-                "codigo_moeda": moeda_row["codigo_moeda"],
-                "valor": row_dict["valor"],
-                "taxa": row_dict["taxa_valor"],
-                "valor_liquido": valor_liquido,
-                "saldo_origem_anterior": saldo_origem_anterior,
-                "saldo_origem_atual": saldo_origem_atual,
-                "saldo_destino_anterior": saldo_destino_anterior,
-                "saldo_destino_atual": saldo_destino_atual,
-                "data_transferencia": row_dict["data_hora"]
-            }
-        
-        return resultado
\ No newline at end of file
+            )).mappings().first()
+
+        if not row:
+            return None
+
+        return {
+            "id_transferencia": row["id_transferencia"],
+            "endereco_origem": row["endereco_origem"],
+            "endereco_destino": row["endereco_destino"],
+            "codigo_moeda": codigo_moeda,
+            "valor": row["valor"],
+            "taxa": row["taxa_valor"],
+            "valor_liquido": valor_liquido,
+            "saldo_origem_anterior": row["saldo_origem_anterior"],
+            "saldo_origem_atual": row["saldo_origem_atual"],
+            "saldo_destino_anterior": row["saldo_destino_anterior"],
+            "saldo_destino_atual": row["saldo_destino_atual"],
+            "data_transferencia": row["data_hora"]
+        }
@@ -1,5 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, Depends, Query
+from typing import Annotated, List
 from api.services.carteira_service import CarteiraService
 from api.persistence.repositories.carteira_repository import CarteiraRepository
 from api.models.carteira_models import (
@@ -11,101 +11,76 @@ from api.models.carteira_models import (
 
 router = APIRouter(prefix="/carteiras", tags=["carteiras"])
 
-def get_carteira_service() -> CarteiraService:
-    repo = CarteiraRepository()
-    return CarteiraService(repo)
+_service = CarteiraService(CarteiraRepository())
+
+async def get_carteira_service() -> CarteiraService:
+    return _service
+
+CarteiraServiceDep = Annotated[CarteiraService, Depends(get_carteira_service)]
 
 @router.post("", response_model=CarteiraCriada, status_code=201)
-def criar_carteira(
-    service: CarteiraService = Depends(get_carteira_service),
+async def criar_carteira(
+    service: CarteiraServiceDep,
 )->CarteiraCriada:
-    try:
-        return service.criar_carteira()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await service.criar_carteira()
 
 @router.get("", response_model=List[Carteira])
-def listar_carteiras(service: CarteiraService = Depends(get_carteira_service)):
-    return service.listar()
+async def listar_carteiras(
+    service: CarteiraServiceDep,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    return await service.listar(limit, offset)
 
 @router.get("/{endereco_carteira}", response_model=Carteira)
-def buscar_carteira(
+async def buscar_carteira(
     endereco_carteira: str,
-    service: CarteiraService = Depends(get_carteira_service),
+    service: CarteiraServiceDep,
 ):
-    try:
-        return service.buscar_por_endereco(endereco_carteira)
-    except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+    return await service.buscar_por_endereco(endereco_carteira)
 
 @router.delete("/{endereco_carteira}", response_model=Carteira)
-def bloquear_carteira(
+async def bloquear_carteira(
     endereco_carteira: str,
-    service: CarteiraService = Depends(get_carteira_service),
+    service: CarteiraServiceDep,
 ):
-    try:
-        return service.bloquear(endereco_carteira)
-    except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+    return await service.bloquear(endereco_carteira)
 
 @router.get("/{endereco_carteira}/saldos", response_model=SaldosCarteira)
-def buscar_saldos(
+async def buscar_saldos(
     endereco_carteira: str,
-    service: CarteiraService = Depends(get_carteira_service),
+    service: CarteiraServiceDep,
 ):
-    try:
-        return service.buscar_saldos_carteira(endereco_carteira)
-    except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+    return await service.buscar_saldos_carteira(endereco_carteira)
 
 @router.post("/{endereco_carteira}/depositos", response_model=OperacaoResponse, status_code=201)
-def realizar_deposito(
+async def realizar_deposito(
     endereco_carteira: str,
     request: DepositoRequest,
-    service: CarteiraService = Depends(get_carteira_service),
+    service: CarteiraServiceDep,
 ):
-    try:
-        return service.realizar_deposito(endereco_carteira, request)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await service.realizar_deposito(endereco_carteira, request)
 
 @router.post("/{endereco_carteira}/saques", response_model=OperacaoResponse, status_code=201)
-def realizar_saque(
+async def realizar_saque(
     endereco_carteira: str,
     request: SaqueRequest,
-    service: CarteiraService = Depends(get_carteira_service),
+    service: CarteiraServiceDep,
 ):
-    try:
-        return service.realizar_saque(endereco_carteira, request)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await service.realizar_saque(endereco_carteira, request)
 
 @router.post("/{endereco_carteira}/conversoes", response_model=ConversaoResponse, status_code=201)
 async def realizar_conversao(
     endereco_carteira: str,
     request: ConversaoRequest,
-    service: CarteiraService = Depends(get_carteira_service),
+    service: CarteiraServiceDep,
 ):
-    try:
-        return await service.realizar_conversao(endereco_carteira, request)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await service.realizar_conversao(endereco_carteira, request)
 
 @router.post("/{endereco_origem}/transferencias", response_model=TransferenciaResponse, status_code=201)
-def realizar_transferencia(
+async def realizar_transferencia(
     endereco_origem: str,
     request: TransferenciaRequest,
-    service: CarteiraService = Depends(get_carteira_service),
+    service: CarteiraServiceDep,
 ):
-    try:
-        return service.realizar_transferencia(endereco_origem, request)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    return await service.realizar_transferencia(endereco_origem, request)
\ No newline at end of file
@@ -1,7 +1,9 @@
-from typing import List, Tuple
+from functools import lru_cache
+from typing import List, Optional
 from decimal import Decimal, InvalidOperation
 import os
 import logging
+from pydantic import TypeAdapter
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from api.persistence.repositories.carteira_repository import CarteiraRepository
 from api.services.coinbase_service import CoinbaseService
@@ -14,6 +16,40 @@ from api.models.carteira_models import (
 
 logger = logging.getLogger(__name__)
 
+_CARTEIRAS_ADAPTER = TypeAdapter(List[Carteira])
+
+_TAXA_DEFAULTS = {
+    "TAXA_SAQUE_PERCENTUAL": Decimal("0.01"),
+    "TAXA_CONVERSAO_PERCENTUAL": Decimal("0.02"),
+    "TAXA_TRANSFERENCIA_PERCENTUAL": Decimal("0.005"),
+}
+
+class NaoEncontrado(ValueError):
+    pass
+
+class SaldoInsuficiente(ValueError):
+    # Guarda só os valores; a mensagem é formatada apenas se alguém a ler.
+    def __init__(
+        self,
+        codigo_moeda: str,
+        valor: Optional[Decimal] = None,
+        taxa: Optional[Decimal] = None,
+        disponivel: Optional[Decimal] = None,
+    ):
+        super().__init__(codigo_moeda)
+        self.codigo_moeda = codigo_moeda
+        self.valor = valor
+        self.taxa = taxa
+        self.disponivel = disponivel
+
+    def __str__(self) -> str:
+        if self.disponivel is not None:
+            return f"Saldo insuficiente em {self.codigo_moeda}. Disponível: {self.disponivel:.8f}"
+        return (
+            f"Saldo insuficiente. Necessário: {self.valor + self.taxa:.8f} "
+            f"(valor: {self.valor:.8f} + taxa: {self.taxa:.8f})"
+        )
+
 class CarteiraService:
     def __init__(self, carteira_repo: CarteiraRepository):
         self.carteira_repo = carteira_repo
@@ -26,37 +62,41 @@ class CarteiraService:
         if not chave_privada or not chave_privada.strip():
             raise ValueError("Chave privada é obrigatória")
 
-    def _obter_carteira_ativa(self, endereco: str) -> dict:
-        carteira = self.carteira_repo.buscar_por_endereco(endereco)
+    async def _obter_carteira_ativa(self, endereco: str) -> dict:
+        carteira = await self.carteira_repo.buscar_por_endereco(endereco)
         if not carteira:
-            raise ValueError("Carteira não encontrada")
+            raise NaoEncontrado("Carteira não encontrada")
         if carteira["status"] != "ATIVA":
             raise ValueError("Carteira bloqueada")
         return carteira
 
-    def _autenticar_carteira(self, endereco: str, chave_privada: str) -> None:
-        if not self.carteira_repo.validar_chave_privada(endereco, chave_privada):
+    async def _autenticar_carteira(self, endereco: str, chave_privada: str) -> None:
+        if not await self.carteira_repo.validar_chave_privada(endereco, chave_privada):
             raise ValueError("Chave privada inválida")
 
-    def _obter_saldo_ou_erro(self, endereco: str, codigo_moeda: str) -> Decimal:
-        saldo = self.carteira_repo.buscar_saldo_moeda(endereco, codigo_moeda)
+    async def _obter_saldo_ou_erro(self, endereco: str, codigo_moeda: str) -> Decimal:
+        saldo = await self.carteira_repo.buscar_saldo_moeda(endereco, codigo_moeda)
         if saldo is None:
             raise ValueError(f"Moeda {codigo_moeda} não encontrada")
         return saldo
 
-    def _obter_taxa_percentual(self, chave_env: str, valor_padrao: str) -> Decimal:
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _obter_taxa_percentual(chave_env: str) -> Decimal:
+        valor_padrao = _TAXA_DEFAULTS[chave_env]
         try:
             return Decimal(os.getenv(chave_env, valor_padrao))
         except (InvalidOperation, ValueError) as e:
             logger.warning(f"Taxa inválida em {chave_env}, usando padrão {valor_padrao}: {e}")
-            return Decimal(valor_padrao)
+            return valor_padrao
 
     def _converter_para_decimal(self, valor: any) -> Decimal:
-        return Decimal(str(valor))
+        # NUMERIC já chega do asyncpg como Decimal; só os demais tipos passam por str.
+        return valor if isinstance(valor, Decimal) else Decimal(str(valor))
 
-    def criar_carteira(self) -> CarteiraCriada:
+    async def criar_carteira(self) -> CarteiraCriada:
         try:
-            row = self.carteira_repo.criar()
+            row = await self.carteira_repo.criar()
             return CarteiraCriada(
                 endereco_carteira=row["endereco_carteira"],
                 data_criacao=row["data_criacao"],
@@ -70,12 +110,12 @@ class CarteiraService:
             logger.error(f"Erro ao criar carteira: {e}")
             raise RuntimeError("Erro ao criar carteira no banco de dados")
 
-    def buscar_por_endereco(self, endereco_carteira: str) -> Carteira:
+    async def buscar_por_endereco(self, endereco_carteira: str) -> Carteira:
         try:
             self._validar_endereco(endereco_carteira)
-            row = self.carteira_repo.buscar_por_endereco(endereco_carteira)
+            row = await self.carteira_repo.buscar_por_endereco(endereco_carteira)
             if not row:
-                raise ValueError("Carteira não encontrada")
+                raise NaoEncontrado("Carteira não encontrada")
 
             return Carteira(
                 endereco_carteira=row["endereco_carteira"],
@@ -88,27 +128,20 @@ class CarteiraService:
             logger.error(f"Erro ao buscar carteira {endereco_carteira}: {e}")
             raise RuntimeError("Erro ao buscar carteira no banco de dados")
 
-    def listar(self) -> List[Carteira]:
+    async def listar(self, limit: int = 100, offset: int = 0) -> List[Carteira]:
         try:
-            rows = self.carteira_repo.listar()
-            return [
-                Carteira(
-                    endereco_carteira=r["endereco_carteira"],
-                    data_criacao=r["data_criacao"],
-                    status=r["status"],
-                )
-                for r in rows
-            ]
+            rows = await self.carteira_repo.listar(limit, offset)
+            return _CARTEIRAS_ADAPTER.validate_python(rows, from_attributes=True)
         except (SQLAlchemyError, KeyError) as e:
             logger.error(f"Erro ao listar carteiras: {e}")
             raise RuntimeError("Erro ao listar carteiras no banco de dados")
 
-    def bloquear(self, endereco_carteira: str) -> Carteira:
+    async def bloquear(self, endereco_carteira: str) -> Carteira:
         try:
             self._validar_endereco(endereco_carteira)
-            row = self.carteira_repo.atualizar_status(endereco_carteira, "BLOQUEADA")
+            row = await self.carteira_repo.atualizar_status(endereco_carteira, "BLOQUEADA")
             if not row:
-                raise ValueError("Carteira não encontrada")
+                raise NaoEncontrado("Carteira não encontrada")
 
             return Carteira(
                 endereco_carteira=row["endereco_carteira"],
@@ -121,12 +154,12 @@ class CarteiraService:
             logger.error(f"Erro ao bloquear carteira {endereco_carteira}: {e}")
             raise RuntimeError("Erro ao bloquear carteira no banco de dados")
 
-    def buscar_saldos_carteira(self, endereco_carteira: str) -> SaldosCarteira:
+    async def buscar_saldos_carteira(self, endereco_carteira: str) -> SaldosCarteira:
         try:
             self._validar_endereco(endereco_carteira)
-            self._obter_carteira_ativa(endereco_carteira)
+            await self._obter_carteira_ativa(endereco_carteira)
 
-            rows = self.carteira_repo.buscar_saldos(endereco_carteira)
+            rows = await self.carteira_repo.buscar_saldos(endereco_carteira)
             saldos = [
                 SaldoMoeda(
                     codigo_moeda=r["codigo_moeda"],
@@ -144,111 +177,72 @@ class CarteiraService:
             logger.error(f"Erro ao buscar saldos da carteira {endereco_carteira}: {e}")
             raise RuntimeError("Erro ao buscar saldos no banco de dados")
 
-    def realizar_deposito(self, endereco_carteira: str, request: DepositoRequest) -> OperacaoResponse:
+    async def realizar_deposito(self, endereco_carteira: str, request: DepositoRequest) -> OperacaoResponse:
         try:
             self._validar_endereco(endereco_carteira)
-            self._obter_carteira_ativa(endereco_carteira)
+            await self._obter_carteira_ativa(endereco_carteira)
 
-            saldo_anterior = self._obter_saldo_ou_erro(endereco_carteira, request.codigo_moeda)
-            saldo_atual = saldo_anterior + request.valor
-
-            self.carteira_repo.atualizar_saldo(endereco_carteira, request.codigo_moeda, saldo_atual)
-
-            operacao = self.carteira_repo.registrar_deposito(
+            operacao = await self.carteira_repo.registrar_deposito(
                 endereco_carteira=endereco_carteira,
                 codigo_moeda=request.codigo_moeda,
-                valor=request.valor,
-                saldo_anterior=saldo_anterior,
-                saldo_atual=saldo_atual
+                valor=request.valor
             )
+            if operacao is None:
+                raise ValueError(f"Moeda {request.codigo_moeda} não encontrada")
 
-            return self._criar_operacao_response(operacao)
+            return OperacaoResponse.model_validate(operacao)
         except ValueError:
             raise
         except (InvalidOperation, SQLAlchemyError, KeyError) as e:
             logger.error(f"Erro ao realizar depósito: {e}")
             raise RuntimeError("Erro ao processar depósito no banco de dados")
 
-    def _criar_operacao_response(self, operacao: dict) -> OperacaoResponse:
-        return OperacaoResponse(
-            id_operacao=operacao["id_operacao"],
-            endereco_carteira=operacao["endereco_carteira"],
-            codigo_moeda=operacao["codigo_moeda"],
-            tipo_operacao=operacao["tipo_operacao"],
-            valor=self._converter_para_decimal(operacao["valor"]),
-            taxa=self._converter_para_decimal(operacao["taxa"]),
-            valor_liquido=self._converter_para_decimal(operacao["valor_liquido"]),
-            saldo_anterior=self._converter_para_decimal(operacao["saldo_anterior"]),
-            saldo_atual=self._converter_para_decimal(operacao["saldo_atual"]),
-            data_operacao=operacao["data_operacao"]
-        )
-
-    def realizar_saque(self, endereco_carteira: str, request: SaqueRequest) -> OperacaoResponse:
+    async def realizar_saque(self, endereco_carteira: str, request: SaqueRequest) -> OperacaoResponse:
         try:
             self._validar_endereco(endereco_carteira)
             self._validar_chave_privada(request.chave_privada)
-            self._obter_carteira_ativa(endereco_carteira)
-            self._autenticar_carteira(endereco_carteira, request.chave_privada)
+            await self._obter_carteira_ativa(endereco_carteira)
+            await self._autenticar_carteira(endereco_carteira, request.chave_privada)
 
-            saldo_anterior = self._obter_saldo_ou_erro(endereco_carteira, request.codigo_moeda)
+            taxa_percentual = self._obter_taxa_percentual("TAXA_SAQUE_PERCENTUAL")
 
-            taxa_percentual = self._obter_taxa_percentual("TAXA_SAQUE_PERCENTUAL", "0.01")
-            taxa = request.valor * taxa_percentual
-            valor_total = request.valor + taxa
-
-            if saldo_anterior < valor_total:
-                raise ValueError(
-                    f"Saldo insuficiente. Necessário: {valor_total:.8f} "
-                    f"(valor: {request.valor:.8f} + taxa: {taxa:.8f})"
-                )
-
-            saldo_atual = saldo_anterior - valor_total
-
-            self.carteira_repo.atualizar_saldo(endereco_carteira, request.codigo_moeda, saldo_atual)
-
-            operacao = self.carteira_repo.registrar_saque(
+            operacao = await self.carteira_repo.registrar_saque(
                 endereco_carteira=endereco_carteira,
                 codigo_moeda=request.codigo_moeda,
                 valor=request.valor,
-                taxa=taxa,
-                valor_liquido=request.valor,
-                saldo_anterior=saldo_anterior,
-                saldo_atual=saldo_atual
+                taxa_percentual=taxa_percentual,
+                valor_liquido=request.valor
             )
+            if operacao is None:
+                # Nada foi debitado; a leitura do saldo só serve para diferenciar
+                # moeda inexistente de saldo insuficiente na mensagem de erro.
+                await self._obter_saldo_ou_erro(endereco_carteira, request.codigo_moeda)
+                raise SaldoInsuficiente(
+                    request.codigo_moeda,
+                    valor=request.valor,
+                    taxa=request.valor * taxa_percentual,
+                )
 
-            return self._criar_operacao_response(operacao)
+            return OperacaoResponse.model_validate(operacao)
         except ValueError:
             raise
         except (InvalidOperation, SQLAlchemyError, KeyError) as e:
             logger.error(f"Erro ao realizar saque: {e}")
             raise RuntimeError("Erro ao processar saque no banco de dados")
 
-    def _obter_saldos_duas_moedas(
-        self, endereco: str, moeda1: str, moeda2: str
-    ) -> Tuple[Decimal, Decimal]:
-        saldo1 = self._obter_saldo_ou_erro(endereco, moeda1)
-        saldo2 = self._obter_saldo_ou_erro(endereco, moeda2)
-        return saldo1, saldo2
-
     async def realizar_conversao(self, endereco_carteira: str, request: ConversaoRequest) -> ConversaoResponse:
         try:
             self._validar_endereco(endereco_carteira)
             self._validar_chave_privada(request.chave_privada)
-            self._obter_carteira_ativa(endereco_carteira)
-            self._autenticar_carteira(endereco_carteira, request.chave_privada)
+            await self._obter_carteira_ativa(endereco_carteira)
+            await self._autenticar_carteira(endereco_carteira, request.chave_privada)
 
             if request.moeda_origem == request.moeda_destino:
                 raise ValueError("Moeda de origem e destino devem ser diferentes")
 
-            saldo_origem_anterior, saldo_destino_anterior = self._obter_saldos_duas_moedas(
-                endereco_carteira, request.moeda_origem, request.moeda_destino
-            )
-
-            if saldo_origem_anterior < request.valor:
-                raise ValueError(
-                    f"Saldo insuficiente em {request.moeda_origem}. "
-                    f"Disponível: {saldo_origem_anterior:.8f}"
-                )
+            for codigo_moeda in (request.moeda_origem, request.moeda_destino):
+                if not await self.carteira_repo.moeda_existe(codigo_moeda):
+                    raise ValueError(f"Moeda {codigo_moeda} não encontrada")
 
             # Obtém cotação da API Coinbase
             try:
@@ -257,56 +251,33 @@ class CarteiraService:
                 logger.error(f"Erro ao obter cotação da Coinbase: {e}")
                 raise RuntimeError("Erro ao consultar cotação das moedas. Tente novamente mais tarde.")
 
-            taxa_percentual = self._obter_taxa_percentual("TAXA_CONVERSAO_PERCENTUAL", "0.02")
+            taxa_percentual = self._obter_taxa_percentual("TAXA_CONVERSAO_PERCENTUAL")
             valor_convertido_bruto = request.valor * cotacao
             taxa_conversao = valor_convertido_bruto * taxa_percentual
             valor_destino = valor_convertido_bruto - taxa_conversao
 
-            saldo_origem_atual = saldo_origem_anterior - request.valor
-            saldo_destino_atual = saldo_destino_anterior + valor_destino
-
-            self.carteira_repo.atualizar_saldo(endereco_carteira, request.moeda_origem, saldo_origem_atual)
-            self.carteira_repo.atualizar_saldo(endereco_carteira, request.moeda_destino, saldo_destino_atual)
-
-            conversao = self.carteira_repo.registrar_conversao(
+            conversao = await self.carteira_repo.registrar_conversao(
                 endereco_carteira=endereco_carteira,
                 moeda_origem=request.moeda_origem,
                 moeda_destino=request.moeda_destino,
                 valor_origem=request.valor,
                 cotacao=cotacao,
                 taxa_conversao=taxa_conversao,
-                valor_destino=valor_destino,
-                saldo_origem_anterior=saldo_origem_anterior,
-                saldo_origem_atual=saldo_origem_atual,
-                saldo_destino_anterior=saldo_destino_anterior,
-                saldo_destino_atual=saldo_destino_atual
+                valor_destino=valor_destino
             )
+            if conversao is None:
+                saldo_origem = await self._obter_saldo_ou_erro(endereco_carteira, request.moeda_origem)
+                await self._obter_saldo_ou_erro(endereco_carteira, request.moeda_destino)
+                raise SaldoInsuficiente(request.moeda_origem, disponivel=saldo_origem)
 
-            return self._criar_conversao_response(conversao)
+            return ConversaoResponse.model_validate(conversao)
         except ValueError:
             raise
         except (InvalidOperation, SQLAlchemyError, KeyError) as e:
             logger.error(f"Erro ao realizar conversão: {e}")
             raise RuntimeError("Erro ao processar conversão no banco de dados")
 
-    def _criar_conversao_response(self, conversao: dict) -> ConversaoResponse:
-        return ConversaoResponse(
-            id_conversao=conversao["id_conversao"],
-            endereco_carteira=conversao["endereco_carteira"],
-            moeda_origem=conversao["moeda_origem"],
-            moeda_destino=conversao["moeda_destino"],
-            valor_origem=self._converter_para_decimal(conversao["valor_origem"]),
-            cotacao=self._converter_para_decimal(conversao["cotacao"]),
-            taxa_conversao=self._converter_para_decimal(conversao["taxa_conversao"]),
-            valor_destino=self._converter_para_decimal(conversao["valor_destino"]),
-            saldo_origem_anterior=self._converter_para_decimal(conversao["saldo_origem_anterior"]),
-            saldo_origem_atual=self._converter_para_decimal(conversao["saldo_origem_atual"]),
-            saldo_destino_anterior=self._converter_para_decimal(conversao["saldo_destino_anterior"]),
-            saldo_destino_atual=self._converter_para_decimal(conversao["saldo_destino_atual"]),
-            data_conversao=conversao["data_conversao"]
-        )
-
-    def realizar_transferencia(self, endereco_origem: str, request: TransferenciaRequest) -> TransferenciaResponse:
+    async def realizar_transferencia(self, endereco_origem: str, request: TransferenciaRequest) -> TransferenciaResponse:
         try:
             self._validar_endereco(endereco_origem, "Endereço da carteira de origem")
             self._validar_endereco(request.endereco_destino, "Endereço da carteira de destino")
@@ -315,74 +286,48 @@ class CarteiraService:
             if endereco_origem == request.endereco_destino:
                 raise ValueError("Não é possível transferir para a mesma carteira")
 
-            self._obter_carteira_ativa(endereco_origem)
-            carteira_destino = self.carteira_repo.buscar_por_endereco(request.endereco_destino)
-            if not carteira_destino:
+            contexto = await self.carteira_repo.carregar_contexto_transferencia(
+                endereco_origem, request.endereco_destino, request.chave_privada
+            )
+            if contexto["origem_status"] is None:
+                raise NaoEncontrado("Carteira não encontrada")
+            if contexto["origem_status"] != "ATIVA":
+                raise ValueError("Carteira bloqueada")
+            if contexto["destino_status"] is None:
                 raise ValueError("Carteira de destino não encontrada")
-            if carteira_destino["status"] != "ATIVA":
+            if contexto["destino_status"] != "ATIVA":
                 raise ValueError("Carteira de destino bloqueada")
+            if not contexto["chave_valida"]:
+                raise ValueError("Chave privada inválida")
 
-            self._autenticar_carteira(endereco_origem, request.chave_privada)
-
-            saldo_origem_anterior = self._obter_saldo_ou_erro(endereco_origem, request.codigo_moeda)
-            saldo_destino_anterior = self.carteira_repo.buscar_saldo_moeda(
-                request.endereco_destino, request.codigo_moeda
-            )
-            if saldo_destino_anterior is None:
-                raise ValueError(
-                    f"Moeda {request.codigo_moeda} não encontrada na carteira de destino"
-                )
-
-            taxa_percentual = self._obter_taxa_percentual("TAXA_TRANSFERENCIA_PERCENTUAL", "0.005")
-            taxa = request.valor * taxa_percentual
-            valor_total_origem = request.valor + taxa
-
-            if saldo_origem_anterior < valor_total_origem:
-                raise ValueError(
-                    f"Saldo insuficiente. Necessário: {valor_total_origem:.8f} "
-                    f"(valor: {request.valor:.8f} + taxa: {taxa:.8f})"
-                )
+            taxa_percentual = self._obter_taxa_percentual("TAXA_TRANSFERENCIA_PERCENTUAL")
 
-            saldo_origem_atual = saldo_origem_anterior - valor_total_origem
-            saldo_destino_atual = saldo_destino_anterior + request.valor
-
-            self.carteira_repo.atualizar_saldo(endereco_origem, request.codigo_moeda, saldo_origem_atual)
-            self.carteira_repo.atualizar_saldo(
-                request.endereco_destino, request.codigo_moeda, saldo_destino_atual
-            )
-
-            transferencia = self.carteira_repo.registrar_transferencia(
+            transferencia = await self.carteira_repo.registrar_transferencia(
                 endereco_origem=endereco_origem,
                 endereco_destino=request.endereco_destino,
                 codigo_moeda=request.codigo_moeda,
                 valor=request.valor,
-                taxa=taxa,
-                valor_liquido=request.valor,
-                saldo_origem_anterior=saldo_origem_anterior,
-                saldo_origem_atual=saldo_origem_atual,
-                saldo_destino_anterior=saldo_destino_anterior,
-                saldo_destino_atual=saldo_destino_atual
+                taxa_percentual=taxa_percentual,
+                valor_liquido=request.valor
             )
+            if transferencia is None:
+                await self._obter_saldo_ou_erro(endereco_origem, request.codigo_moeda)
+                saldo_destino = await self.carteira_repo.buscar_saldo_moeda(
+                    request.endereco_destino, request.codigo_moeda
+                )
+                if saldo_destino is None:
+                    raise ValueError(
+                        f"Moeda {request.codigo_moeda} não encontrada na carteira de destino"
+                    )
+                raise SaldoInsuficiente(
+                    request.codigo_moeda,
+                    valor=request.valor,
+                    taxa=request.valor * taxa_percentual,
+                )
 
-            return self._criar_transferencia_response(transferencia)
+            return TransferenciaResponse.model_validate(transferencia)
         except ValueError:
             raise
         except (InvalidOperation, SQLAlchemyError, KeyError) as e:
             logger.error(f"Erro ao realizar transferência: {e}")
             raise RuntimeError("Erro ao processar transferência no banco de dados")
-
-    def _criar_transferencia_response(self, transferencia: dict) -> TransferenciaResponse:
-        return TransferenciaResponse(
-            id_transferencia=transferencia["id_transferencia"],
-            endereco_origem=transferencia["endereco_origem"],
-            endereco_destino=transferencia["endereco_destino"],
-            codigo_moeda=transferencia["codigo_moeda"],
-            valor=self._converter_para_decimal(transferencia["valor"]),
-            taxa=self._converter_para_decimal(transferencia["taxa"]),
-            valor_liquido=self._converter_para_decimal(transferencia["valor_liquido"]),
-            saldo_origem_anterior=self._converter_para_decimal(transferencia["saldo_origem_anterior"]),
-            saldo_origem_atual=self._converter_para_decimal(transferencia["saldo_origem_atual"]),
-            saldo_destino_anterior=self._converter_para_decimal(transferencia["saldo_destino_anterior"]),
-            saldo_destino_atual=self._converter_para_decimal(transferencia["saldo_destino_atual"]),
-            data_transferencia=transferencia["data_transferencia"]
-        )
\ No newline at end of file
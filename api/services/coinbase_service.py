@@ -1,26 +1,191 @@
+import asyncio
+import logging
+import os
+import re
+import time
 from decimal import Decimal
+from typing import Dict, FrozenSet, Optional, Tuple
 import httpx
+import orjson
+
+logger = logging.getLogger(__name__)
+
+_AMOUNT_RE = re.compile(rb'"amount"\s*:\s*"([0-9]+(?:\.[0-9]+)?)"')
 
 class CoinbaseService:
     BASE_URL = "https://api.coinbase.com/v2/prices"
-    
+    CACHE_TTL = float(os.getenv("COTACAO_CACHE_TTL", "30"))
+    REFRESH_INTERVAL = float(os.getenv("COTACAO_REFRESH_INTERVAL", "15"))
+    MAX_STALE = float(os.getenv("COTACAO_MAX_STALE", "300"))
+    REFRESH_IDLE = float(os.getenv("COTACAO_REFRESH_IDLE", "300"))
+    # Pares com paridade 1:1 configurada (ex.: "USDT-USD"), valem nos dois sentidos.
+    PARES_FIXOS: FrozenSet[Tuple[str, str]] = frozenset(
+        par
+        for item in os.getenv("COTACAO_PARES_FIXOS", "").split(",")
+        if "-" in item
+        for origem, destino in [item.strip().upper().split("-", 1)]
+        for par in ((origem, destino), (destino, origem))
+    )
+
+    _client: Optional[httpx.AsyncClient] = None
+    _cache: Dict[Tuple[str, str], Tuple[Decimal, float]] = {}
+    _em_andamento: Dict[Tuple[str, str], asyncio.Task] = {}
+    _atualizadores: Dict[Tuple[str, str], asyncio.Task] = {}
+    _ultimo_pedido: Dict[Tuple[str, str], float] = {}
+
+    @staticmethod
+    def _obter_client() -> httpx.AsyncClient:
+        # Um único cliente mantém as conexões TLS abertas entre as cotações.
+        if CoinbaseService._client is None or CoinbaseService._client.is_closed:
+            CoinbaseService._client = httpx.AsyncClient(
+                base_url=CoinbaseService.BASE_URL,
+                timeout=10.0,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            )
+        return CoinbaseService._client
+
+    @staticmethod
+    async def fechar() -> None:
+        tarefas = [*CoinbaseService._atualizadores.values(), *CoinbaseService._em_andamento.values()]
+        CoinbaseService._atualizadores.clear()
+        CoinbaseService._em_andamento.clear()
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+
+        if CoinbaseService._client is not None:
+            await CoinbaseService._client.aclose()
+            CoinbaseService._client = None
+
+    @staticmethod
+    def _entrada_valida(entrada: Optional[Tuple[Decimal, float]], validade: float) -> bool:
+        return entrada is not None and time.monotonic() - entrada[1] < validade
+
+    @staticmethod
+    def _cotacao_em_cache(par: Tuple[str, str], validade: Optional[float] = None) -> Optional[Decimal]:
+        # A cotação inversa em cache também responde: A-B = 1 / (B-A). Cada
+        # entrada tem sua própria validade e, se as duas valerem, vence a mais nova.
+        direta = CoinbaseService._cache.get(par)
+        inversa = CoinbaseService._cache.get(par[::-1])
+        direta_valida = CoinbaseService._entrada_valida(
+            direta, validade if validade is not None else CoinbaseService._validade(par)
+        )
+        inversa_valida = inversa is not None and inversa[0] != 0 and CoinbaseService._entrada_valida(
+            inversa, validade if validade is not None else CoinbaseService._validade(par[::-1])
+        )
+
+        if inversa_valida and (not direta_valida or inversa[1] > direta[1]):
+            return Decimal(1) / inversa[0]
+        if direta_valida:
+            return direta[0]
+        return None
+
+    @staticmethod
+    def _validade(par: Tuple[str, str]) -> float:
+        # Entrada mantida por um atualizador em segundo plano: a requisição não
+        # espera pela Coinbase e serve o último valor enquanto não passar de MAX_STALE.
+        if par in CoinbaseService._atualizadores:
+            return max(CoinbaseService.CACHE_TTL, CoinbaseService.MAX_STALE)
+        return CoinbaseService.CACHE_TTL
+
+    @staticmethod
+    async def _atualizar_periodicamente(par: Tuple[str, str]) -> None:
+        while True:
+            await asyncio.sleep(CoinbaseService.REFRESH_INTERVAL)
+
+            # Ninguém pediu o par (nem o inverso) há REFRESH_IDLE segundos:
+            # encerra e deixa o próximo pedido iniciar outro atualizador.
+            ultimo_pedido = max(
+                CoinbaseService._ultimo_pedido.get(par, 0.0),
+                CoinbaseService._ultimo_pedido.get(par[::-1], 0.0),
+            )
+            if time.monotonic() - ultimo_pedido > CoinbaseService.REFRESH_IDLE:
+                CoinbaseService._atualizadores.pop(par, None)
+                return
+
+            try:
+                cotacao = await CoinbaseService._buscar_cotacao(*par)
+                CoinbaseService._cache[par] = (cotacao, time.monotonic())
+            except Exception as e:
+                logger.warning(f"Falha ao atualizar cotação {par[0]}-{par[1]}: {e}")
+
     @staticmethod
     async def obter_cotacao(moeda_origem: str, moeda_destino: str) -> Decimal:
-        url = f"{CoinbaseService.BASE_URL}/{moeda_origem}-{moeda_destino}/spot"
+        par = (moeda_origem, moeda_destino)
+        if par in CoinbaseService.PARES_FIXOS:
+            return Decimal(1)
+
+        CoinbaseService._ultimo_pedido[par] = time.monotonic()
+        cotacao = CoinbaseService._cotacao_em_cache(par)
+        if cotacao is not None:
+            return cotacao
+
+        # Só uma requisição por par vai à Coinbase; as concorrentes aguardam a
+        # mesma tarefa e recebem o mesmo resultado, inclusive o erro.
+        tarefa = CoinbaseService._em_andamento.get(par)
+        if tarefa is None:
+            tarefa = asyncio.create_task(CoinbaseService._buscar_e_armazenar(par))
+            CoinbaseService._em_andamento[par] = tarefa
+            tarefa.add_done_callback(lambda t: CoinbaseService._encerrar_busca(par, t))
+        # shield: se quem pediu for cancelado, a busca segue para os demais.
+        return await asyncio.shield(tarefa)
+
+    @staticmethod
+    def _encerrar_busca(par: Tuple[str, str], tarefa: asyncio.Task) -> None:
+        if CoinbaseService._em_andamento.get(par) is tarefa:
+            del CoinbaseService._em_andamento[par]
+        if not tarefa.cancelled():
+            tarefa.exception()
+
+    @staticmethod
+    async def _buscar_e_armazenar(par: Tuple[str, str]) -> Decimal:
+        try:
+            cotacao = await CoinbaseService._buscar_cotacao(*par)
+        except ValueError:
+            # Coinbase indisponível: um valor antigo, dentro de MAX_STALE,
+            # ainda é melhor do que falhar a conversão.
+            cotacao = CoinbaseService._cotacao_em_cache(par, CoinbaseService.MAX_STALE)
+            if cotacao is None:
+                raise
+            logger.warning(f"Usando cotação em cache para {par[0]}-{par[1]}")
+            return cotacao
+
+        CoinbaseService._cache[par] = (cotacao, time.monotonic())
+        if par not in CoinbaseService._atualizadores:
+            CoinbaseService._atualizadores[par] = asyncio.create_task(
+                CoinbaseService._atualizar_periodicamente(par)
+            )
+        return cotacao
+
+    @staticmethod
+    async def aquecer(moeda_origem: str = "BTC", moeda_destino: str = "USD") -> None:
+        # Abre a conexão e popula o cache sem iniciar um atualizador: o par só
+        # passa a ser atualizado em segundo plano quando alguém o pedir.
+        cotacao = await CoinbaseService._buscar_cotacao(moeda_origem, moeda_destino)
+        CoinbaseService._cache[(moeda_origem, moeda_destino)] = (cotacao, time.monotonic())
+
+    @staticmethod
+    async def _buscar_cotacao(moeda_origem: str, moeda_destino: str) -> Decimal:
+        client = CoinbaseService._obter_client()
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, timeout=10.0)
-                response.raise_for_status()
-                
-                data = response.json()
+            response = await client.get(f"/{moeda_origem}-{moeda_destino}/spot")
+            response.raise_for_status()
+            
+            # A resposta é minúscula: extrai o amount direto dos bytes e só
+            # decodifica o JSON inteiro se o formato não bater.
+            match = _AMOUNT_RE.search(response.content)
+            if match:
+                return Decimal(match.group(1).decode())
+
+            data = orjson.loads(response.content)
+            
+            if "data" in data and "amount" in data["data"]:
+                cotacao = Decimal(data["data"]["amount"])
+                return cotacao
+            else:
+                raise ValueError(f"Resposta inesperada da API: {data}")
                 
-                if "data" in data and "amount" in data["data"]:
-                    cotacao = Decimal(data["data"]["amount"])
-                    return cotacao
-                else:
-                    raise ValueError(f"Resposta inesperada da API: {data}")
-                    
         except httpx.HTTPStatusError as e:
             raise ValueError(f"Erro ao obter cotação {moeda_origem}-{moeda_destino}: {e.response.status_code}")
         except httpx.RequestError as e:
@@ -34,6 +34,8 @@ CREATE TABLE IF NOT EXISTS carteira (
     PRIMARY KEY (endereco_carteira)
 );
 
+CREATE INDEX IF NOT EXISTS ix_carteira_data_criacao ON carteira (data_criacao DESC, endereco_carteira DESC);
+
 CREATE TABLE IF NOT EXISTS moeda (
     id_moeda SERIAL PRIMARY KEY,
     codigo VARCHAR(10) NOT NULL UNIQUE,
@@ -67,6 +69,8 @@ CREATE TABLE IF NOT EXISTS deposito_saque (
     FOREIGN KEY (id_moeda) REFERENCES moeda(id_moeda)
 );
 
+CREATE INDEX IF NOT EXISTS ix_deposito_saque_endereco ON deposito_saque (endereco_carteira, data_hora DESC);
+
 CREATE TABLE IF NOT EXISTS conversao (
     id_conversao BIGSERIAL PRIMARY KEY,
     endereco_carteira VARCHAR(255) NOT NULL,